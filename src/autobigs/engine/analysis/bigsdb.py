@@ -14,7 +14,7 @@ from aiohttp import ClientSession, ClientTimeout
 from autobigs.engine.reading import read_fasta
 from autobigs.engine.structures.alignment import PairwiseAlignment
 from autobigs.engine.structures.genomics import NamedString
-from autobigs.engine.structures.mlst import Allele, NamedMLSTProfile, AlignmentStats, MLSTProfile
+from autobigs.engine.structures.mlst import Allele, MLSTProfileChange, NamedMLSTProfile, AlignmentStats, MLSTProfile, SchemeVersion
 from autobigs.engine.exceptions.database import NoBIGSdbExactMatchesException, NoBIGSdbMatchesException, NoSuchBIGSdbDatabaseException
 
 from Bio.Align import PairwiseAligner
@@ -37,6 +37,18 @@ class BIGSdbMLSTProfiler(AbstractAsyncContextManager):
     def profile_multiple_strings(self, query_named_string_groups: AsyncIterable[Iterable[NamedString]], stop_on_fail: bool = False) -> AsyncGenerator[NamedMLSTProfile, Any]:
         pass
 
+    @abstractmethod
+    async def get_scheme_version(self) -> SchemeVersion:
+        pass
+
+    @abstractmethod
+    async def get_scheme_loci(self) -> Sequence[str]:
+        pass
+
+    @abstractmethod
+    def retype_multiple_profiles(self, prior_profiles: Iterable[NamedMLSTProfile], prior_scheme_version: SchemeVersion, query_named_string_groups: Union[AsyncIterable[Iterable[NamedString]], None] = None) -> AsyncGenerator[MLSTProfileChange, Any]:
+        pass
+
     @abstractmethod
     async def close(self):
         pass
@@ -136,6 +148,90 @@ class RemoteBIGSdbMLSTProfiler(BIGSdbMLSTProfiler):
                     raise e
                 yield NamedMLSTProfile("-".join(names), None)
 
+    async def get_scheme_version(self) -> SchemeVersion:
+        async with self._http_client.get("") as response:
+            response_json: dict = await response.json()
+            return SchemeVersion(
+                database_name=self._database_name,
+                schema_id=self._schema_id,
+                last_updated=str(response_json.get("last_updated", "unknown")),
+                profile_count=int(response_json.get("records", -1))
+            )
+
+    async def get_scheme_loci(self) -> Sequence[str]:
+        async with self._http_client.get("") as response:
+            response_json: dict = await response.json()
+            return [str(locus).split("/")[-1] for locus in response_json.get("loci", [])]
+
+    async def retype_multiple_profiles(self, prior_profiles: Iterable[NamedMLSTProfile], prior_scheme_version: SchemeVersion, query_named_string_groups: Union[AsyncIterable[Iterable[NamedString]], None] = None) -> AsyncGenerator[MLSTProfileChange, Any]:
+        if prior_scheme_version.database_name != self._database_name or prior_scheme_version.schema_id != self._schema_id:
+            raise ValueError(f"Scheme version record is for schema {prior_scheme_version.schema_id} in \"{prior_scheme_version.database_name}\", not schema {self._schema_id} in \"{self._database_name}\".")
+        scheme_loci = set(await self.get_scheme_loci())
+        scheme_changed: Union[bool, None] = None
+        unresolved: dict[str, MLSTProfile] = dict()
+        for named_profile in prior_profiles:
+            prior_profile = named_profile.mlst_profile
+            if prior_profile is None:
+                continue
+            called_loci = {allele.allele_locus for allele in prior_profile.alleles}
+            if not scheme_loci.issubset(called_loci) or any(allele.partial_match_profile is not None for allele in prior_profile.alleles):
+                unresolved[named_profile.name] = prior_profile
+                continue
+            if prior_profile.sequence_type != "unknown":
+                continue
+            if scheme_changed is None:
+                current_scheme_version = await self.get_scheme_version()
+                scheme_changed = current_scheme_version.last_updated == "unknown" \
+                    or current_scheme_version.last_updated != prior_scheme_version.last_updated \
+                    or current_scheme_version.profile_count != prior_scheme_version.profile_count
+            if not scheme_changed:
+                continue
+            # Exact allele calls cannot change, so only the profile lookup is repeated
+            resolved_profile = await self.determine_mlst_st(prior_profile.alleles)
+            current_profile = MLSTProfile(prior_profile.alleles, resolved_profile.sequence_type, resolved_profile.clonal_complex)
+            if _mlst_calls_differ(prior_profile, current_profile):
+                yield MLSTProfileChange(named_profile.name, prior_profile, current_profile)
+
+        if len(unresolved) == 0:
+            return
+        # New alleles do not necessarily bump the scheme version, so partial and missing loci are always re-queried
+        if query_named_string_groups is not None:
+            async for named_strings in query_named_string_groups:
+                names: list[str] = list()
+                sequences: list[str] = list()
+                for named_string in named_strings:
+                    names.append(named_string.name)
+                    sequences.append(named_string.sequence)
+                name = "-".join(names)
+                if name not in unresolved:
+                    continue
+                prior_profile = unresolved.pop(name)
+                partial_alleles: dict[str, list[Allele]] = defaultdict(list)
+                for allele in prior_profile.alleles:
+                    if allele.partial_match_profile is not None:
+                        partial_alleles[allele.allele_locus].append(allele)
+                unresolved_loci = partial_alleles.keys() | (scheme_loci - {allele.allele_locus for allele in prior_profile.alleles})
+                alleles = [allele for allele in prior_profile.alleles if allele.allele_locus not in partial_alleles]
+                requeried_alleles: dict[str, list[Allele]] = defaultdict(list)
+                try:
+                    async for allele in self.determine_mlst_allele_variants(sequences):
+                        if allele.allele_locus in unresolved_loci:
+                            requeried_alleles[allele.allele_locus].append(allele)
+                except NoBIGSdbMatchesException:
+                    yield MLSTProfileChange(name, prior_profile, None)
+                    continue
+                for locus in sorted(unresolved_loci):
+                    # Loci left out of the re-query keep their earlier partial call, or stay uncalled
+                    alleles.extend(requeried_alleles.get(locus, partial_alleles.get(locus, [])))
+                resolved_profile = await self.determine_mlst_st(alleles)
+                current_profile = MLSTProfile(tuple(alleles), resolved_profile.sequence_type, resolved_profile.clonal_complex)
+                if _mlst_calls_differ(prior_profile, current_profile):
+                    yield MLSTProfileChange(name, prior_profile, current_profile)
+                if len(unresolved) == 0:
+                    return
+        for name, prior_profile in unresolved.items():
+            yield MLSTProfileChange(name, prior_profile, None)
+
     async def close(self):
         await self._http_client.close()
 
@@ -200,6 +296,15 @@ class BIGSdbIndex(AbstractAsyncContextManager):
     async def __aexit__(self, exc_type, exc_value, traceback):
         await self.close()
 
+def _mlst_calls_differ(previous_profile: MLSTProfile, current_profile: MLSTProfile) -> bool:
+    if previous_profile.sequence_type != current_profile.sequence_type:
+        return True
+    if previous_profile.clonal_complex != current_profile.clonal_complex:
+        return True
+    previous_calls = {(allele.allele_locus, allele.allele_variant, allele.partial_match_profile is None) for allele in previous_profile.alleles}
+    current_calls = {(allele.allele_locus, allele.allele_variant, allele.partial_match_profile is None) for allele in current_profile.alleles}
+    return previous_calls != current_calls
+
 def get_BIGSdb_MLST_profiler(local: bool, database_api: str, database_name: str, schema_id: int):
     if local:
         raise NotImplementedError()
@@ -1,9 +1,26 @@
+import ast
 import asyncio
+import csv
+from dataclasses import replace
 from io import TextIOWrapper
-from typing import Any, AsyncGenerator, Iterable, Union
+import json
+from os import PathLike
+import re
+from typing import Any, AsyncGenerator, Iterable, Sequence, Union
 from Bio import SeqIO
 
-from autobigs.engine.structures.genomics import NamedString
+from autobigs.engine.structures.alignment import AlignmentStats
+from autobigs.engine.structures.genomics import NamedString, SequenceQCStats
+from autobigs.engine.structures.mlst import Allele, MLSTProfile, NamedMLSTProfile, SchemeVersion
+
+# The results CSV only records that a call was partial, not the alignment behind it
+UNRECORDED_ALIGNMENT_STATS = AlignmentStats(percent_identity=float("nan"), mismatches=-1, gaps=-1, match_metric=-1)
+
+_WHITESPACE_AND_GAPS = b" \t\r\n\v\f-."
+_URACIL_TO_THYMINE = bytes.maketrans(b"Uu", b"TT")
+_UNAMBIGUOUS_BASES = b"ACGT"
+_IUPAC_CODES = b"ACGTRYSWKMBDHVN"
+_N_RUN = re.compile(rb"N+")
 
 async def read_fasta(handle: Union[str, TextIOWrapper]) -> Iterable[NamedString]:
     fasta_sequences = asyncio.to_thread(SeqIO.parse, handle=handle, format="fasta")
@@ -14,4 +31,104 @@ async def read_fasta(handle: Union[str, TextIOWrapper]) -> Iterable[NamedString]
 
 async def read_multiple_fastas(handles: Iterable[Union[str, TextIOWrapper]]) -> AsyncGenerator[Iterable[NamedString], Any]:
     for handle in handles:
-        yield await read_fasta(handle)
\ No newline at end of file
+        yield await read_fasta(handle)
+
+def normalize_named_string(named_string: NamedString, source: str = "", min_length: int = 1, max_length: Union[int, None] = None, max_ambiguity_fraction: Union[float, None] = None, max_n_run: Union[int, None] = None, trim_terminal_ns: bool = True) -> tuple[Union[NamedString, None], SequenceQCStats]:
+    # Every pass below is a single bytes operation over the whole buffer rather than a per-base loop
+    original = named_string.sequence.encode("ascii", errors="replace")
+    sequence = original.translate(_URACIL_TO_THYMINE, _WHITESPACE_AND_GAPS).upper()
+    if trim_terminal_ns:
+        sequence = sequence.strip(b"N")
+    length = len(sequence)
+    ambiguous_bases = len(sequence.translate(None, _UNAMBIGUOUS_BASES))
+    ambiguity_fraction = ambiguous_bases / length if length > 0 else 0.0
+    longest_n_run = max(map(len, _N_RUN.findall(sequence)), default=0)
+
+    rejection_reason = None
+    if len(sequence.translate(None, _IUPAC_CODES)) > 0:
+        rejection_reason = "contains non-IUPAC characters"
+    elif length < min_length:
+        rejection_reason = f"shorter than {min_length} bases"
+    elif max_length is not None and length > max_length:
+        rejection_reason = f"longer than {max_length} bases"
+    elif max_ambiguity_fraction is not None and ambiguity_fraction > max_ambiguity_fraction:
+        rejection_reason = f"ambiguity fraction above {max_ambiguity_fraction}"
+    elif max_n_run is not None and longest_n_run > max_n_run:
+        rejection_reason = f"N-run longer than {max_n_run} bases"
+
+    qc_stats = SequenceQCStats(
+        source=source,
+        name=named_string.name,
+        original_length=len(original),
+        normalized_length=length,
+        ambiguous_bases=ambiguous_bases,
+        ambiguity_fraction=ambiguity_fraction,
+        longest_n_run=longest_n_run,
+        rejection_reason=rejection_reason
+    )
+    if rejection_reason is not None:
+        return None, qc_stats
+    return NamedString(named_string.name, sequence.decode("ascii")), qc_stats
+
+def normalize_named_strings(named_strings: Iterable[NamedString], source: str = "", deduplicate: bool = True, **normalization_kwargs) -> tuple[Sequence[NamedString], Sequence[SequenceQCStats]]:
+    accepted: list[NamedString] = list()
+    qc_stats: list[SequenceQCStats] = list()
+    seen: dict[str, str] = dict()
+    for named_string in named_strings:
+        normalized, named_string_qc_stats = normalize_named_string(named_string, source, **normalization_kwargs)
+        if normalized is not None and deduplicate:
+            if normalized.sequence in seen:
+                named_string_qc_stats = replace(named_string_qc_stats, rejection_reason=f"duplicate of {seen[normalized.sequence]}")
+                normalized = None
+            else:
+                seen[normalized.sequence] = named_string.name
+        if normalized is not None:
+            accepted.append(normalized)
+        qc_stats.append(named_string_qc_stats)
+    return accepted, qc_stats
+
+async def read_normalized_fasta(handle: Union[str, TextIOWrapper], deduplicate: bool = True, **normalization_kwargs) -> tuple[Sequence[NamedString], Sequence[SequenceQCStats]]:
+    source = str(getattr(handle, "name", handle))
+    named_strings = await read_fasta(handle)
+    return await asyncio.to_thread(normalize_named_strings, named_strings, source, deduplicate, **normalization_kwargs)
+
+async def read_multiple_normalized_fastas(handles: Iterable[Union[str, TextIOWrapper]], qc_stats: Union[list[SequenceQCStats], None] = None, rejected_sources: Union[list[str], None] = None, deduplicate: bool = True, **normalization_kwargs) -> AsyncGenerator[Sequence[NamedString], Any]:
+    for handle in handles:
+        named_strings, handle_qc_stats = await read_normalized_fasta(handle, deduplicate, **normalization_kwargs)
+        if qc_stats is not None:
+            qc_stats.extend(handle_qc_stats)
+        if len(named_strings) == 0:
+            # Files with no usable records, including empty ones, are never profiled
+            if rejected_sources is not None:
+                rejected_sources.append(str(getattr(handle, "name", handle)))
+            continue
+        yield named_strings
+
+def text_to_alleles(locus: str, text: str) -> Iterable[Allele]:
+    variants = ast.literal_eval(text) if text.startswith("(") else (text,)
+    for variant in variants:
+        if variant.endswith("*"):
+            yield Allele(locus, variant[:-1], UNRECORDED_ALIGNMENT_STATS)
+        else:
+            yield Allele(locus, variant, None)
+
+def _parse_mlst_profiles_csv(handle: Union[str, bytes, PathLike[str], PathLike[bytes]]) -> Iterable[NamedMLSTProfile]:
+    results = []
+    with open(handle, newline='') as filehandle:
+        for row in csv.DictReader(filehandle):
+            name = row.pop("id")
+            sequence_type = row.pop("st")
+            clonal_complex = row.pop("clonal-complex")
+            alleles = []
+            for locus, text in row.items():
+                if text:
+                    alleles.extend(text_to_alleles(locus, text))
+            results.append(NamedMLSTProfile(name, MLSTProfile(tuple(alleles), sequence_type, clonal_complex)))
+    return results
+
+async def read_mlst_profiles_from_csv(handle: Union[str, bytes, PathLike[str], PathLike[bytes]]) -> Iterable[NamedMLSTProfile]:
+    return await asyncio.to_thread(_parse_mlst_profiles_csv, handle)
+
+async def read_scheme_version(handle: Union[str, bytes, PathLike[str], PathLike[bytes]]) -> SchemeVersion:
+    with open(handle) as filehandle:
+        return SchemeVersion(**json.load(filehandle))
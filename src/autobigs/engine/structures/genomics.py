@@ -15,6 +15,17 @@ class NamedString:
     name: str
     sequence: str
 
+@dataclass(frozen=True)
+class SequenceQCStats:
+    source: str
+    name: str
+    original_length: int
+    normalized_length: int
+    ambiguous_bases: int
+    ambiguity_fraction: float
+    longest_n_run: int
+    rejection_reason: Union[None, str]
+
 @dataclass(frozen=True)
 class AnnotatedString(NamedString):
     annotations: Sequence[StringAnnotation]
@@ -21,6 +21,19 @@ class NamedMLSTProfile:
     name: str
     mlst_profile: Union[None, MLSTProfile]
 
+@dataclass(frozen=True)
+class MLSTProfileChange:
+    name: str
+    previous_profile: MLSTProfile
+    current_profile: Union[None, MLSTProfile]
+
+@dataclass(frozen=True)
+class SchemeVersion:
+    database_name: str
+    schema_id: int
+    last_updated: str
+    profile_count: int
+
 
 def alleles_to_mapping(alleles: Iterable[Allele]):
     result = defaultdict(list)
@@ -1,9 +1,12 @@
 from collections import defaultdict
+from dataclasses import asdict
 import csv
+import json
 from os import PathLike
-from typing import AsyncIterable, Collection, Mapping, Sequence, Union
+from typing import AsyncIterable, Collection, Iterable, Mapping, Sequence, Union
 
-from autobigs.engine.structures.mlst import Allele, MLSTProfile, NamedMLSTProfile
+from autobigs.engine.structures.genomics import SequenceQCStats
+from autobigs.engine.structures.mlst import Allele, MLSTProfile, MLSTProfileChange, NamedMLSTProfile, SchemeVersion
 
 
 def alleles_to_text_map(alleles: Collection[Allele]) -> Mapping[str, Union[Sequence[str], str]]:
@@ -40,4 +43,56 @@ async def write_mlst_profiles_as_csv(mlst_profiles_iterable: AsyncIterable[Named
                 **allele_mapping
             }
             writer.writerow(rowdict=row_dictionary)
-    return failed
\ No newline at end of file
+    return failed
+
+def mlst_profile_to_text_map(mlst_profile: MLSTProfile) -> Mapping[str, Union[Sequence[str], str]]:
+    return {
+        "st": mlst_profile.sequence_type,
+        "clonal-complex": mlst_profile.clonal_complex,
+        **alleles_to_text_map(mlst_profile.alleles)
+    }
+
+async def write_mlst_profile_changes_as_csv(mlst_profile_changes_iterable: AsyncIterable[MLSTProfileChange], handle: Union[str, bytes, PathLike[str], PathLike[bytes]]) -> Sequence[str]:
+    failed = list()
+    with open(handle, "w", newline='') as filehandle:
+        writer = csv.DictWriter(filehandle, fieldnames=["id", "field", "previous", "current"])
+        writer.writeheader()
+        async for mlst_profile_change in mlst_profile_changes_iterable:
+            if mlst_profile_change.current_profile is None:
+                failed.append(mlst_profile_change.name)
+                continue
+            previous_mapping = mlst_profile_to_text_map(mlst_profile_change.previous_profile)
+            current_mapping = mlst_profile_to_text_map(mlst_profile_change.current_profile)
+            fields = ["st", "clonal-complex", *sorted((previous_mapping.keys() | current_mapping.keys()) - {"st", "clonal-complex"})]
+            for field in fields:
+                previous = previous_mapping.get(field, "")
+                current = current_mapping.get(field, "")
+                if previous == current:
+                    continue
+                writer.writerow(rowdict={
+                    "id": mlst_profile_change.name,
+                    "field": field,
+                    "previous": previous,
+                    "current": current
+                })
+    return failed
+
+async def write_scheme_version(scheme_version: SchemeVersion, handle: Union[str, bytes, PathLike[str], PathLike[bytes]]):
+    with open(handle, "w") as filehandle:
+        json.dump(asdict(scheme_version), filehandle)
+
+async def write_sequence_qc_stats_as_csv(qc_stats: Iterable[SequenceQCStats], handle: Union[str, bytes, PathLike[str], PathLike[bytes]]):
+    with open(handle, "w", newline='') as filehandle:
+        writer = csv.DictWriter(filehandle, fieldnames=["source", "name", "original-length", "normalized-length", "ambiguous-bases", "ambiguity-fraction", "longest-n-run", "rejection-reason"])
+        writer.writeheader()
+        for named_qc_stats in qc_stats:
+            writer.writerow(rowdict={
+                "source": named_qc_stats.source,
+                "name": named_qc_stats.name,
+                "original-length": named_qc_stats.original_length,
+                "normalized-length": named_qc_stats.normalized_length,
+                "ambiguous-bases": named_qc_stats.ambiguous_bases,
+                "ambiguity-fraction": named_qc_stats.ambiguity_fraction,
+                "longest-n-run": named_qc_stats.longest_n_run,
+                "rejection-reason": named_qc_stats.rejection_reason or ""
+            })
\ No newline at end of file
@@ -1,13 +1,23 @@
+from collections import defaultdict
 from os import path
+import importlib.metadata
+import json
+import multiprocessing
+import os
+import platform
 import random
 import re
-from typing import Callable, Collection, Sequence, Union
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Collection, Mapping, Sequence, Union
 from Bio import SeqIO
 import pytest
 from autobigs.engine.analysis import bigsdb
 from autobigs.engine.structures import mlst
 from autobigs.engine.structures.genomics import NamedString
-from autobigs.engine.structures.mlst import Allele, MLSTProfile
+from autobigs.engine.structures.alignment import AlignmentStats
+from autobigs.engine.structures.mlst import Allele, MLSTProfile, MLSTProfileChange, NamedMLSTProfile, SchemeVersion
 from autobigs.engine.exceptions.database import NoBIGSdbExactMatchesException, NoBIGSdbMatchesException
 from autobigs.engine.analysis.bigsdb import BIGSdbIndex, BIGSdbMLSTProfiler, RemoteBIGSdbMLSTProfiler
 
@@ -15,16 +25,70 @@ async def generate_async_iterable(normal_iterable):
     for dummy_sequence in normal_iterable:
         yield dummy_sequence
 
-def gene_scrambler(gene: str, mutation_site_count: Union[int, float], alphabet: Sequence[str] = ["A", "T", "C", "G"]):
-    rand = random.Random(gene)
+def gene_scrambler(gene: str, mutation_site_count: Union[int, float], alphabet: Sequence[str] = ["A", "T", "C", "G"], insertion_rate: float = 0.0, deletion_rate: float = 0.0, seed: Union[None, int, str] = None):
+    rand = random.Random(gene if seed is None else seed)
     if isinstance(mutation_site_count, float):
         mutation_site_count = int(mutation_site_count * len(gene))
     random_locations = rand.choices(range(len(gene)), k=mutation_site_count)
     scrambled = list(gene)
     for random_location in random_locations:
         scrambled[random_location] = rand.choice(alphabet)
+    if insertion_rate > 0 or deletion_rate > 0:
+        indelled = list()
+        for base in scrambled:
+            roll = rand.random()
+            if roll < deletion_rate:
+                continue
+            indelled.append(base)
+            if roll >= 1 - insertion_rate:
+                indelled.append(rand.choice(alphabet))
+        scrambled = indelled
     return "".join(scrambled)
 
+def generate_synthetic_scheme(locus_count: int, alleles_per_locus: int, allele_length: int = 450, mutation_rate: float = 0.02, indel_rate: float = 0.0, seed: int = 0) -> Mapping[str, Sequence[NamedString]]:
+    rand = random.Random(seed)
+    scheme = dict()
+    for locus_index in range(locus_count):
+        locus = f"locus{locus_index}"
+        reference = "".join(rand.choices("ATCG", k=allele_length))
+        scheme[locus] = [NamedString(str(allele_index + 1), gene_scrambler(reference, mutation_rate, insertion_rate=indel_rate, deletion_rate=indel_rate, seed=f"{seed}-{locus}-{allele_index}")) for allele_index in range(alleles_per_locus)]
+    return scheme
+
+def generate_synthetic_genome(scheme: Mapping[str, Sequence[NamedString]], genome_length: int, seed: int = 0) -> tuple[str, Collection[Allele]]:
+    rand = random.Random(seed)
+    picked = [(locus, rand.choice(alleles)) for locus, alleles in scheme.items()]
+    backbone_length = max(genome_length - sum(len(allele.sequence) for _, allele in picked), 0)
+    backbone = "".join(rand.choices("ATCG", k=backbone_length))
+    insertion_sites = sorted(rand.choices(range(backbone_length + 1), k=len(picked)))
+    genome = list()
+    previous_site = 0
+    for insertion_site, (_, allele) in zip(insertion_sites, picked):
+        genome.append(backbone[previous_site:insertion_site])
+        genome.append(allele.sequence)
+        previous_site = insertion_site
+    genome.append(backbone[previous_site:])
+    return "".join(genome), {Allele(locus, allele.name, None) for locus, allele in picked}
+
+class ExactMatchAlleleIndex:
+    SEED_LENGTH = 31
+
+    def __init__(self, scheme: Mapping[str, Sequence[NamedString]]):
+        self._seeds: dict[str, list[tuple[str, Allele]]] = defaultdict(list)
+        for locus, alleles in scheme.items():
+            for allele in alleles:
+                self._seeds[allele.sequence[:ExactMatchAlleleIndex.SEED_LENGTH]].append((allele.sequence, Allele(locus, allele.name, None)))
+
+    def call(self, genome: str) -> Collection[Allele]:
+        called = set()
+        for position in range(len(genome) - ExactMatchAlleleIndex.SEED_LENGTH + 1):
+            candidates = self._seeds.get(genome[position:position + ExactMatchAlleleIndex.SEED_LENGTH])
+            if candidates is None:
+                continue
+            for sequence, allele in candidates:
+                if genome.startswith(sequence, position):
+                    called.add(allele)
+        return called
+
 def get_first_sequence_from_fasta(resource: str):
     return str(SeqIO.read(path.join("tests/resources/", resource), "fasta").seq)
 
@@ -169,6 +233,106 @@ class TestBIGSdbMLSTProfiler:
                     assert profile.clonal_complex == expected_profile.clonal_complex
                     assert profile.sequence_type == expected_profile.sequence_type
 
+    async def test_retype_resolves_unknown_st_from_stored_alleles(self, local_db, database_api, database_name, schema_id, seq_path: str, feature_seqs_path: str, expected_profile: MLSTProfile, bad_profile: MLSTProfile):
+        prior_profiles = [NamedMLSTProfile("stale", MLSTProfile(expected_profile.alleles, "unknown", "unknown"))]
+        prior_scheme_version = SchemeVersion(database_name, schema_id, "1970-01-01", 0)
+        async with bigsdb.get_BIGSdb_MLST_profiler(local_db, database_api, database_name, schema_id) as dummy_profiler:
+            changes = [change async for change in dummy_profiler.retype_multiple_profiles(prior_profiles, prior_scheme_version)]
+            assert len(changes) == 1
+            assert changes[0].name == "stale"
+            assert changes[0].current_profile.sequence_type == expected_profile.sequence_type
+            assert changes[0].current_profile.clonal_complex == expected_profile.clonal_complex
+
+    async def test_retype_skips_unknown_st_when_scheme_unchanged(self, local_db, database_api, database_name, schema_id, seq_path: str, feature_seqs_path: str, expected_profile: MLSTProfile, bad_profile: MLSTProfile):
+        prior_profiles = [NamedMLSTProfile("stale", MLSTProfile(expected_profile.alleles, "unknown", "unknown"))]
+        async with bigsdb.get_BIGSdb_MLST_profiler(local_db, database_api, database_name, schema_id) as dummy_profiler:
+            prior_scheme_version = await dummy_profiler.get_scheme_version()
+            changes = [change async for change in dummy_profiler.retype_multiple_profiles(prior_profiles, prior_scheme_version)]
+            assert len(changes) == 0
+
+    async def test_retype_replaces_resolved_partial_calls_and_keeps_unresolved(self, local_db, database_api, database_name, schema_id, seq_path: str, feature_seqs_path: str, expected_profile: MLSTProfile, bad_profile: MLSTProfile):
+        genome = get_first_sequence_from_fasta(seq_path)
+        target_sequences = get_multiple_sequences_from_fasta(feature_seqs_path)
+        mlst_targets = {x.lower(): x for x in mlst.alleles_to_mapping(expected_profile.alleles).keys()}
+        scrambled_locus = None
+        for target_sequence in target_sequences:
+            match = re.fullmatch(r".*\[gene=([\w\d]+)\].*", target_sequence.description)
+            if match is None or match.group(1).lower() not in mlst_targets:
+                continue
+            for feature in (str(target_sequence.seq), str(target_sequence.seq.reverse_complement())):
+                if feature in genome:
+                    genome = genome.replace(feature, gene_scrambler(feature, 0.125), 1)
+                    scrambled_locus = mlst_targets[match.group(1).lower()]
+                    break
+            if scrambled_locus is not None:
+                break
+        assert scrambled_locus is not None
+
+        prior_partial_stats = AlignmentStats(90, 10, 0, 90)
+        prior_profile = MLSTProfile(tuple(Allele(allele.allele_locus, allele.allele_variant, prior_partial_stats) for allele in bad_profile.alleles), "unknown", "unknown")
+        prior_scheme_version = SchemeVersion(database_name, schema_id, "1970-01-01", 0)
+        expected_alleles = mlst.alleles_to_mapping(expected_profile.alleles)
+        async with bigsdb.get_BIGSdb_MLST_profiler(local_db, database_api, database_name, schema_id) as profiler:
+            changes = [change async for change in profiler.retype_multiple_profiles([NamedMLSTProfile("genome", prior_profile)], prior_scheme_version, generate_async_iterable([[NamedString("genome", genome)]]))]
+            assert len(changes) == 1
+            current_profile = changes[0].current_profile
+            assert current_profile is not None
+            current_alleles = {allele.allele_locus: allele for allele in current_profile.alleles}
+            assert current_alleles.keys() == expected_alleles.keys()
+            for locus, allele in current_alleles.items():
+                if locus == scrambled_locus:
+                    assert allele.partial_match_profile is not None
+                else:
+                    assert allele.partial_match_profile is None
+                    assert allele.allele_variant == expected_alleles[locus]
+
+    async def test_retype_requeries_isolates_missing_loci(self, local_db, database_api, database_name, schema_id, seq_path: str, feature_seqs_path: str, expected_profile: MLSTProfile, bad_profile: MLSTProfile):
+        genome = get_first_sequence_from_fasta(seq_path)
+        missing_locus = sorted(allele.allele_locus for allele in expected_profile.alleles)[0]
+        prior_profile = MLSTProfile(tuple(allele for allele in expected_profile.alleles if allele.allele_locus != missing_locus), "unknown", "unknown")
+        prior_scheme_version = SchemeVersion(database_name, schema_id, "1970-01-01", 0)
+        async with bigsdb.get_BIGSdb_MLST_profiler(local_db, database_api, database_name, schema_id) as profiler:
+            changes = [change async for change in profiler.retype_multiple_profiles([NamedMLSTProfile("genome", prior_profile)], prior_scheme_version, generate_async_iterable([[NamedString("genome", genome)]]))]
+            assert len(changes) == 1
+            current_profile = changes[0].current_profile
+            assert current_profile is not None
+            assert mlst.alleles_to_mapping(current_profile.alleles) == mlst.alleles_to_mapping(expected_profile.alleles)
+            assert current_profile.sequence_type == expected_profile.sequence_type
+
+            changes = [change async for change in profiler.retype_multiple_profiles([NamedMLSTProfile("missing", prior_profile)], prior_scheme_version)]
+            assert changes == [MLSTProfileChange("missing", prior_profile, None)]
+
+    async def test_retype_rejects_scheme_version_for_other_schema(self, local_db, database_api, database_name, schema_id, seq_path: str, feature_seqs_path: str, expected_profile: MLSTProfile, bad_profile: MLSTProfile):
+        prior_scheme_version = SchemeVersion(database_name, schema_id + 1, "1970-01-01", 0)
+        async with bigsdb.get_BIGSdb_MLST_profiler(local_db, database_api, database_name, schema_id) as profiler:
+            with pytest.raises(ValueError):
+                async for _ in profiler.retype_multiple_profiles([NamedMLSTProfile("isolate", expected_profile)], prior_scheme_version):
+                    pass
+
+    async def test_retype_reports_partial_isolates_without_sequences(self, local_db, database_api, database_name, schema_id, seq_path: str, feature_seqs_path: str, expected_profile: MLSTProfile, bad_profile: MLSTProfile):
+        prior_profile = MLSTProfile(tuple(Allele(allele.allele_locus, allele.allele_variant, AlignmentStats(90, 10, 0, 90)) for allele in bad_profile.alleles), "unknown", "unknown")
+        prior_scheme_version = SchemeVersion(database_name, schema_id, "1970-01-01", 0)
+        async with bigsdb.get_BIGSdb_MLST_profiler(local_db, database_api, database_name, schema_id) as profiler:
+            changes = [change async for change in profiler.retype_multiple_profiles([NamedMLSTProfile("missing", prior_profile)], prior_scheme_version, generate_async_iterable([]))]
+            assert changes == [MLSTProfileChange("missing", prior_profile, None)]
+
+class TestMLSTCallsDiffer:
+    def test_partial_stats_alone_are_not_a_change(self):
+        previous_profile = MLSTProfile((Allele("A", "1", None), Allele("B", "2", AlignmentStats(90, 10, 0, 90))), "unknown", "unknown")
+        current_profile = MLSTProfile((Allele("A", "1", None), Allele("B", "2", AlignmentStats(95, 5, 0, 95))), "unknown", "unknown")
+        assert not bigsdb._mlst_calls_differ(previous_profile, current_profile)
+
+    @pytest.mark.parametrize("current_profile", [
+        MLSTProfile((Allele("A", "1", None), Allele("B", "2", None)), "unknown", "unknown"),
+        MLSTProfile((Allele("A", "1", None), Allele("B", "3", AlignmentStats(90, 10, 0, 90))), "unknown", "unknown"),
+        MLSTProfile((Allele("A", "1", None),), "unknown", "unknown"),
+        MLSTProfile((Allele("A", "1", None), Allele("B", "2", AlignmentStats(90, 10, 0, 90))), "5", "unknown"),
+        MLSTProfile((Allele("A", "1", None), Allele("B", "2", AlignmentStats(90, 10, 0, 90))), "unknown", "ST-5 complex"),
+    ])
+    def test_call_changes_are_detected(self, current_profile: MLSTProfile):
+        previous_profile = MLSTProfile((Allele("A", "1", None), Allele("B", "2", AlignmentStats(90, 10, 0, 90))), "unknown", "unknown")
+        assert bigsdb._mlst_calls_differ(previous_profile, current_profile)
+
 class TestBIGSdbIndex:
 
     async def test_bigsdb_index_all_databases_is_not_empty(self):
@@ -209,3 +373,125 @@ class TestBIGSdbIndex:
                 profile = await profiler.profile_string(sequence)
                 assert profile.clonal_complex == "ST-2 complex"
                 assert profile.sequence_type == "1"
+
+
+AlleleCaller = Callable[[str], Collection[Allele]]
+
+_benchmark_allele_caller: Union[AlleleCaller, None] = None
+
+def _call_with_benchmark_allele_caller(genome: str) -> Collection[Allele]:
+    return _benchmark_allele_caller(genome) # type: ignore since the pool is only started once it is set
+
+def build_exact_match_allele_caller(scheme: Mapping[str, Sequence[NamedString]]) -> AlleleCaller:
+    return ExactMatchAlleleIndex(scheme).call
+
+def engine_version() -> str:
+    try:
+        return importlib.metadata.version("autoBIGS.engine")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+def benchmark_worker_counts() -> Sequence[int]:
+    max_workers = max(int(os.environ.get("AUTOBIGS_BENCHMARK_MAX_WORKERS", os.cpu_count() or 1)), 1)
+    worker_counts = {max_workers}
+    worker_count = 1
+    while worker_count < max_workers:
+        worker_counts.add(worker_count)
+        worker_count *= 2
+    return sorted(worker_counts)
+
+def run_allele_calling_benchmark(build_allele_caller: Callable[[Mapping[str, Sequence[NamedString]]], AlleleCaller], scheme: Mapping[str, Sequence[NamedString]], genomes: Sequence[tuple[str, Collection[Allele]]], worker_counts: Sequence[int]) -> dict:
+    global _benchmark_allele_caller
+    already_tracing = tracemalloc.is_tracing()
+    if already_tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    traced_before_build, _ = tracemalloc.get_traced_memory()
+    build_start = time.perf_counter()
+    _benchmark_allele_caller = build_allele_caller(scheme)
+    build_seconds = time.perf_counter() - build_start
+    traced_after_build, traced_peak = tracemalloc.get_traced_memory()
+    index_bytes = traced_after_build - traced_before_build
+    index_peak_bytes = traced_peak - traced_before_build
+    if not already_tracing:
+        tracemalloc.stop()
+
+    try:
+        call_latencies = list()
+        for genome, expected_alleles in genomes:
+            call_start = time.perf_counter()
+            called_alleles = _benchmark_allele_caller(genome)
+            call_latencies.append(time.perf_counter() - call_start)
+            assert set(called_alleles) == set(expected_alleles)
+
+        scaling = list()
+        fork_context = multiprocessing.get_context("fork")
+        for worker_count in worker_counts:
+            with fork_context.Pool(worker_count) as pool:
+                scaling_start = time.perf_counter()
+                pool.map(_call_with_benchmark_allele_caller, [genome for genome, _ in genomes])
+                scaling_seconds = time.perf_counter() - scaling_start
+            scaling.append({
+                "workers": worker_count,
+                "seconds": scaling_seconds,
+                "genomes_per_second": len(genomes) / scaling_seconds
+            })
+    finally:
+        _benchmark_allele_caller = None
+
+    return {
+        "allele_caller": build_allele_caller.__name__,
+        "index_build_seconds": build_seconds,
+        "index_bytes": index_bytes,
+        "index_peak_bytes": index_peak_bytes,
+        "call_latency_mean_seconds": statistics.mean(call_latencies),
+        "call_latency_median_seconds": statistics.median(call_latencies),
+        "call_latency_max_seconds": max(call_latencies),
+        "scaling": scaling
+    }
+
+class TestSyntheticSchemes:
+    def test_gene_scrambler_defaults_are_unchanged_without_indels(self):
+        gene = "ATCG" * 100
+        assert gene_scrambler(gene, 0.125) == gene_scrambler(gene, 0.125, insertion_rate=0.0, deletion_rate=0.0)
+        assert len(gene_scrambler(gene, 0.125)) == len(gene)
+
+    def test_gene_scrambler_indels_change_length(self):
+        gene = "ATCG" * 100
+        assert len(gene_scrambler(gene, 0, deletion_rate=0.1)) < len(gene)
+        assert len(gene_scrambler(gene, 0, insertion_rate=0.1)) > len(gene)
+
+    def test_exact_match_index_recovers_synthetic_genome_alleles(self):
+        scheme = generate_synthetic_scheme(7, 20, seed=1)
+        genome, expected_alleles = generate_synthetic_genome(scheme, 20_000, seed=1)
+        assert ExactMatchAlleleIndex(scheme).call(genome) == expected_alleles
+
+@pytest.mark.skipif("AUTOBIGS_BENCHMARK_OUTPUT" not in os.environ, reason="Set AUTOBIGS_BENCHMARK_OUTPUT to a JSON Lines path to run benchmarks.")
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="Worker scaling relies on forked workers inheriting the index.")
+@pytest.mark.parametrize("locus_count,alleles_per_locus,genome_length,genome_count", [
+    (7, 100, 100_000, 16),
+    (7, 1_000, 100_000, 16),
+    (50, 100, 100_000, 16),
+    (7, 100, 2_000_000, 8),
+])
+class TestLocalAlleleCallingBenchmark:
+    def test_local_allele_calling_scaling(self, locus_count: int, alleles_per_locus: int, genome_length: int, genome_count: int):
+        scheme = generate_synthetic_scheme(locus_count, alleles_per_locus)
+        genomes = [generate_synthetic_genome(scheme, genome_length, seed=genome_index) for genome_index in range(genome_count)]
+        # Stand-in until get_BIGSdb_MLST_profiler(local=True) exists, at which point only the caller passed here changes
+        benchmark = run_allele_calling_benchmark(build_exact_match_allele_caller, scheme, genomes, benchmark_worker_counts())
+        result = {
+            "timestamp": time.time(),
+            "engine_version": engine_version(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "locus_count": locus_count,
+            "alleles_per_locus": alleles_per_locus,
+            "genome_length": genome_length,
+            "genome_count": genome_count,
+            **benchmark
+        }
+        with open(os.environ["AUTOBIGS_BENCHMARK_OUTPUT"], "a") as benchmark_output:
+            benchmark_output.write(json.dumps(result) + "\n")
@@ -1,7 +1,124 @@
-from autobigs.engine.reading import read_fasta
+from os import path
+import tempfile
+from typing import Iterable
+import pytest
+from autobigs.engine.reading import normalize_named_string, normalize_named_strings, read_fasta, read_mlst_profiles_from_csv, read_multiple_normalized_fastas, read_scheme_version
+from autobigs.engine.structures.alignment import AlignmentStats
+from autobigs.engine.structures.genomics import NamedString
+from autobigs.engine.structures.mlst import Allele, MLSTProfile, NamedMLSTProfile, SchemeVersion
+from autobigs.engine.writing import alleles_to_text_map, write_mlst_profiles_as_csv, write_scheme_version
+
+async def iterable_to_asynciterable(iterable: Iterable):
+    for iterated in iterable:
+        yield iterated
 
 
 async def test_fasta_reader_not_none():
     named_strings = await read_fasta("tests/resources/tohama_I_bpertussis.fasta")
     for named_string in named_strings:
         assert named_string.name == "BX470248.1"
+
+async def test_mlst_profiles_csv_round_trips_partial_and_multiple_alleles():
+    profile = NamedMLSTProfile("name", MLSTProfile((
+        Allele("A", "1", None),
+        Allele("B", "3", AlignmentStats(90, 10, 0, 90)),
+        Allele("C", "1", None),
+        Allele("C", "2", AlignmentStats(90, 10, 0, 90))
+    ), "unknown", "unknown"))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = path.join(temp_dir, "out.csv")
+        await write_mlst_profiles_as_csv(iterable_to_asynciterable([profile]), output_path)
+        named_profiles = list(await read_mlst_profiles_from_csv(output_path))
+    assert len(named_profiles) == 1
+    assert named_profiles[0].name == "name"
+    read_profile = named_profiles[0].mlst_profile
+    assert read_profile is not None
+    assert read_profile.sequence_type == "unknown"
+    assert alleles_to_text_map(read_profile.alleles) == {
+        "A": "1",
+        "B": "3*",
+        "C": ("1", "2*")
+    }
+
+async def test_scheme_version_round_trips():
+    scheme_version = SchemeVersion("pubmlst_bordetella_seqdef", 3, "2024-01-01", 42)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = path.join(temp_dir, "scheme.json")
+        await write_scheme_version(scheme_version, output_path)
+        assert (await read_scheme_version(output_path)) == scheme_version
+
+def test_normalize_named_string_uppercases_and_strips():
+    normalized, qc_stats = normalize_named_string(NamedString("contig", "nnacgt\nacgtnNN "))
+    assert normalized == NamedString("contig", "ACGTACGT")
+    assert qc_stats.original_length == 15
+    assert qc_stats.normalized_length == 8
+    assert qc_stats.rejection_reason is None
+
+@pytest.mark.parametrize("sequence", [
+    "ACG-T",
+    "AC.GT",
+    "ACGU",
+    "acgu",
+])
+def test_normalize_named_string_strips_gaps_and_converts_uracil(sequence: str):
+    normalized, qc_stats = normalize_named_string(NamedString("contig", sequence))
+    assert normalized is not None
+    assert normalized.sequence == "ACGT"
+    assert qc_stats.rejection_reason is None
+
+def test_normalize_named_string_reports_ambiguity_and_n_runs():
+    normalized, qc_stats = normalize_named_string(NamedString("contig", "ACGTNNNRACGT"), max_ambiguity_fraction=0.5)
+    assert normalized is not None
+    assert qc_stats.ambiguous_bases == 4
+    assert qc_stats.ambiguity_fraction == 4 / 12
+    assert qc_stats.longest_n_run == 3
+
+@pytest.mark.parametrize("sequence,kwargs", [
+    ("ACGT", {"min_length": 5}),
+    ("ACGTACGT", {"max_length": 4}),
+    ("ACGTRYSW", {"max_ambiguity_fraction": 0.25}),
+    ("ACGTNNNNACGT", {"max_n_run": 3}),
+    ("ACGT123", {}),
+    ("ACGT#ACGT", {}),
+    ("NNNN", {}),
+    ("--..", {}),
+    ("AC-GT", {"min_length": 5}),
+    ("ACGU", {"min_length": 5}),
+])
+def test_normalize_named_string_rejects(sequence: str, kwargs: dict):
+    normalized, qc_stats = normalize_named_string(NamedString("contig", sequence), **kwargs)
+    assert normalized is None
+    assert qc_stats.rejection_reason is not None
+
+def test_normalize_named_strings_deduplicates_contigs():
+    named_strings, qc_stats = normalize_named_strings([NamedString("first", "ACGT"), NamedString("second", "acgt"), NamedString("third", "TTTT")])
+    assert [named_string.name for named_string in named_strings] == ["first", "third"]
+    assert qc_stats[1].rejection_reason == "duplicate of first"
+
+async def test_normalized_fasta_reader_keeps_valid_genome():
+    qc_stats = []
+    groups = [group async for group in read_multiple_normalized_fastas(["tests/resources/tohama_I_bpertussis.fasta"], qc_stats)]
+    assert len(groups) == 1
+    assert groups[0][0].name == "BX470248.1"
+    assert len(qc_stats) == 1
+    assert qc_stats[0].source == "tests/resources/tohama_I_bpertussis.fasta"
+    assert qc_stats[0].rejection_reason is None
+
+async def test_normalized_fasta_reader_reports_fully_rejected_file():
+    qc_stats = []
+    rejected_sources = []
+    groups = [group async for group in read_multiple_normalized_fastas(["tests/resources/tohama_I_bpertussis.fasta"], qc_stats, rejected_sources, max_length=10)]
+    assert len(groups) == 0
+    assert rejected_sources == ["tests/resources/tohama_I_bpertussis.fasta"]
+    assert len(qc_stats) == 1
+    assert qc_stats[0].source == "tests/resources/tohama_I_bpertussis.fasta"
+    assert qc_stats[0].rejection_reason == "longer than 10 bases"
+
+async def test_normalized_fasta_reader_reports_empty_file():
+    rejected_sources = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        empty_path = path.join(temp_dir, "empty.fasta")
+        open(empty_path, "w").close()
+        groups = [group async for group in read_multiple_normalized_fastas([empty_path], rejected_sources=rejected_sources)]
+    assert len(groups) == 0
+    assert rejected_sources == [empty_path]
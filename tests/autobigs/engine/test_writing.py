@@ -2,8 +2,9 @@ from typing import AsyncIterable, Iterable
 
 import pytest
 from autobigs.engine.structures.alignment import AlignmentStats
-from autobigs.engine.writing import alleles_to_text_map, write_mlst_profiles_as_csv
-from autobigs.engine.structures.mlst import Allele, MLSTProfile, NamedMLSTProfile
+from autobigs.engine.structures.genomics import SequenceQCStats
+from autobigs.engine.writing import alleles_to_text_map, write_mlst_profile_changes_as_csv, write_mlst_profiles_as_csv, write_sequence_qc_stats_as_csv
+from autobigs.engine.structures.mlst import Allele, MLSTProfile, MLSTProfileChange, NamedMLSTProfile
 import tempfile
 from csv import reader
 from os import path
@@ -45,3 +46,41 @@ async def test_alleles_to_text_map_mapping_is_correct(dummy_alphabet_mlst_profil
     for allele_name, allele_ids in mapping.items():
         assert allele_name in expected_mapping
         assert allele_ids == expected_mapping[allele_name]
+
+async def test_mlst_profile_changes_only_lists_changed_fields(dummy_alphabet_mlst_profile: NamedMLSTProfile):
+    previous_profile: MLSTProfile = dummy_alphabet_mlst_profile.mlst_profile # type: ignore
+    current_profile = MLSTProfile((
+        Allele("A", "1", None),
+        Allele("D", "1", None),
+        Allele("B", "1", None),
+        Allele("C", "1", None),
+        Allele("C", "7", None)
+    ), "5", "very mysterious")
+    changes = [MLSTProfileChange("name", previous_profile, current_profile), MLSTProfileChange("not_retyped", previous_profile, None)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = path.join(temp_dir, "changes.csv")
+        failed = await write_mlst_profile_changes_as_csv(iterable_to_asynciterable(changes), output_path)
+        with open(output_path) as csv_handle:
+            lines = list(reader(csv_handle))
+    assert failed == ["not_retyped"]
+    assert lines == [
+        ["id", "field", "previous", "current"],
+        ["name", "st", "mysterious", "5"],
+        ["name", "C", "('1', '2*')", "('1', '7')"]
+    ]
+
+async def test_sequence_qc_stats_csv_has_source_column():
+    qc_stats = [
+        SequenceQCStats("isolate_a.fasta", "contig_1", 4, 4, 0, 0.0, 0, None),
+        SequenceQCStats("isolate_a.fasta", "contig_2", 4, 4, 0, 0.0, 0, "duplicate of contig_1"),
+        SequenceQCStats("isolate_b.fasta", "contig_1", 4, 4, 4, 1.0, 4, "shorter than 5 bases")
+    ]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = path.join(temp_dir, "qc.csv")
+        await write_sequence_qc_stats_as_csv(qc_stats, output_path)
+        with open(output_path) as csv_handle:
+            lines = list(reader(csv_handle))
+    assert len(lines) == 4
+    assert lines[0][:2] == ["source", "name"]
+    assert lines[3][:2] == ["isolate_b.fasta", "contig_1"]
+    assert lines[2][-1] == "duplicate of contig_1"